@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 
 import sys
+import time
 
 
 if sys.version_info.major == 2:
@@ -10,6 +11,9 @@ if sys.version_info.major == 2:
     class ConnectionRefusedError(ConnectionError):
         pass
 
+    # No monotonic clock on py2.
+    monotonic = time.time
+
     class range(object):
 
         def __init__(self, *args):
@@ -36,4 +40,5 @@ else:
     ConnectionError = ConnectionError
     ConnectionRefusedError = ConnectionRefusedError
     range = range
+    monotonic = time.monotonic
 
@@ -6,18 +6,35 @@ pync - arbitrary TCP and UDP connections and listens (Netcat for Python).
 
 from __future__ import unicode_literals
 import argparse
+import array
 import contextlib
 import errno
+import functools
 import itertools
 import logging
+import os
 import random
 import select
 import shlex
+import signal
 import socket
+import stat
 import subprocess
 import sys
+import threading
 import time
 
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+try:
+    import selectors
+except ImportError:
+    # py2
+    selectors = None
+
 import socks
 
 from .argparsing import GroupingArgumentParser
@@ -56,6 +73,102 @@ TOSKEYWORDS = dict(
 )
 
 
+# Linux socket option, not exported by the socket module.
+SO_BUSY_POLL = getattr(socket, 'SO_BUSY_POLL', 46)
+
+# connect_ex errors for a non-blocking connect that hasn't finished yet.
+_CONNECT_IN_PROGRESS = (
+        errno.EINPROGRESS,
+        errno.EWOULDBLOCK,
+        getattr(errno, 'WSAEWOULDBLOCK', errno.EWOULDBLOCK),
+)
+
+
+def _wait_readable(sock, timeout=.25):
+    """
+    Wait for a server socket to have a connection/datagram waiting.
+
+    On POSIX a blocking accept/recv is interrupted by ctrl-c so this
+    returns True straight away and the caller blocks instead.
+    ctrl-c doesn't break out of a blocking accept on Windows, so poll
+    with select there and return False if nothing arrived in time.
+
+    Raises ValueError or socket.error if the socket is closed.
+    """
+    if sys.platform != 'win32':
+        if sock.fileno() == -1:
+            raise ValueError('socket is closed')
+        return True
+    readables, _, _ = select.select([sock], [], [], timeout)
+    return sock in readables
+
+
+_servbyport_cache = dict()
+
+
+def _getservbyport(port, protocol_name):
+    """
+    Cached socket.getservbyport, which searches the services
+    database on every call. Returns None if port has no service name.
+    """
+    key = (port, protocol_name)
+    try:
+        return _servbyport_cache[key]
+    except KeyError:
+        pass
+    try:
+        name = socket.getservbyport(port, protocol_name)
+    except (socket.error, OSError):
+        name = None
+    _servbyport_cache[key] = name
+    return name
+
+
+def _set_nodelay(sock):
+    """
+    Disable Nagle's algorithm so small writes (e.g. typed lines)
+    are sent straight away instead of being held back to coalesce.
+    """
+    if hasattr(socket, 'TCP_NODELAY'):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def _set_reuseport(sock):
+    # Not available on Windows.
+    if hasattr(socket, 'SO_REUSEPORT'):
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+
+
+def _is_ip_literal(addr):
+    """
+    Return True if addr is a numeric IPv4 or IPv6 address.
+    False if it isn't or this can't be told without a lookup.
+    """
+    if not hasattr(socket, 'inet_pton'):
+        # py2 on Windows
+        return False
+    for family in (socket.AF_INET, socket.AF_INET6):
+        try:
+            socket.inet_pton(family, addr)
+        except (socket.error, ValueError):
+            continue
+        return True
+    return False
+
+
+def _split_args(args):
+    """
+    Split a command-line string the way a POSIX shell would.
+    """
+    # Raises AttributeError up front if args isn't a string.
+    split = args.split
+    # shlex walks the string a character at a time, which is only
+    # needed when there's quoting or escaping to deal with.
+    if '"' in args or "'" in args or '\\' in args:
+        return shlex.split(args)
+    return split()
+
+
 class NetcatError(Exception):
     
     def __init__(self, msg, *args):
@@ -84,6 +197,10 @@ class NetcatProxyError(NetcatError):
         self.proxy_err =  proxy_err
 
 
+class NetcatArgumentError(NetcatError):
+    pass
+
+
 class NetcatContext(object):
     D = False
     v = False
@@ -153,6 +270,9 @@ class NetcatConnection(NetcatContext):
     :param q: Quit the readwrite loop after EOF on stdin and delay of secs.
     :type q: int, optional
 
+    :param plen: Max number of bytes to read/send at a time.
+    :type plen: int, optional
+
     You can use sub-classes of this class as a context manager using the "with" statement:
 
     .. code-block:: python
@@ -175,9 +295,12 @@ class NetcatConnection(NetcatContext):
     i = 0
     q = 0
     w = None
-    plen = 2048
+    plen = 65536
+    # Max extra recvs to drain the socket with per write.
+    drain_count = 16
 
-    def __init__(self, net, C=None, d=None, i=None, q=None, w=None, **kwargs):
+    def __init__(self, net, C=None, d=None, i=None, q=None, w=None,
+            plen=None, **kwargs):
         super(NetcatConnection, self).__init__(**kwargs)
 
         self.net = net
@@ -192,12 +315,23 @@ class NetcatConnection(NetcatContext):
             self.q = q
         if w is not None:
             self.w = w
+        if plen is not None:
+            self.plen = plen
 
         self.dest, self.port = self._getpeername(net)
 
         # TODO: Move this into a property.setter?
         if self.stdin is sys.__stdin__ and self.stdin.isatty():
             self.stdin = ConsoleInput()
+        self._stdin_fd = self._fileno(self.stdin)
+        # py3 read/write bytes with the underlying buffer.
+        # py2 read/write bytes with the file.
+        self._stdin_read = getattr(self.stdin, 'buffer', self.stdin).read
+        self._stdout_write = getattr(self.stdout, 'buffer', self.stdout).write
+        # Flush stdout after each write when something may be reading
+        # it as data arrives (tty, pipe, socket). A regular file is only
+        # flushed when the readwrite loop finishes.
+        self._stdout_flush_each = not self._is_regular_file(self.stdout)
 
     @classmethod
     def connect(cls, dest, port, **kwargs):
@@ -279,6 +413,42 @@ class NetcatConnection(NetcatContext):
         if self.net in can_read:
             return self.net.recv(n)
 
+    def _drain(self, data, n):
+        """
+        Receive anything else already queued on the socket without
+        blocking, so it can be written to stdout in one go.
+        Returns (data, eof, error) where error is a socket error
+        that ended the drain, to be handled once data is written.
+        """
+        if not hasattr(socket, 'MSG_DONTWAIT'):
+            # Windows
+            return data, False, None
+        # NetcatUDPConnection.recv only turns errors into
+        # StopReadWrite, readwrite stops the same way on error.
+        if type(self).recv not in (NetcatConnection.recv, NetcatUDPConnection.recv):
+            # Don't bypass a sub-class's recv.
+            return data, False, None
+
+        chunks = [data]
+        eof = False
+        error = None
+        for _ in compat.range(self.drain_count):
+            try:
+                chunk = self.net.recv(n, socket.MSG_DONTWAIT)
+            except (socket.error, OSError) as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK, errno.EINTR):
+                    # e.g. a reset or an ICMP error on a UDP socket.
+                    # The socket only reports it once, so it can't
+                    # be left for the next recv.
+                    error = e
+                # Otherwise nothing is left.
+                break
+            if not chunk:
+                eof = True
+                break
+            chunks.append(chunk)
+        return b''.join(chunks), eof, error
+
     def send(self, data):
         self.net.sendall(data)
 
@@ -316,53 +486,110 @@ class NetcatConnection(NetcatContext):
         netin_eof = False
         stdin_eof = None
 
-        idle_time = time.time()
+        # Hoist lookups out of the loop.
+        monotonic = compat.monotonic
+        recv, send, read_stdin = self.recv, self.send, self._read_stdin
+        stdout_write, stdout_flush = self._stdout_write, self.stdout.flush
+        flush_each = self._stdout_flush_each
+        plen, C, d, i, q = self.plen, self.C, self.d, self.i, self.q
+        timeout = self.timeout
+
+        idle_time = monotonic()
+
+        # Block on a selector when both the network and stdin can be
+        # waited on, otherwise fall back to polling each iteration.
+        sel = self._create_selector()
+        blocking = sel is not None
+        zerocopy_stdin = self._stdin_zerocopy()
+        zerocopy_net = None
+        if sel is not None:
+            # Only when the selector says the network is readable,
+            # splice would block otherwise.
+            zerocopy_net = self._net_zerocopy()
+        if zerocopy_net is not None:
+            # Anything already buffered has to go first.
+            stdout_flush()
 
-        # (     )
-        #   O O
-        while(1<2):
-            try:
+        try:
+            while True:
                 if netin_eof:
                     break
 
-                if self.i:
-                    time.sleep(self.i)
+                if i:
+                    time.sleep(i)
+
+                can_recv = can_read_stdin = True
+                if sel is not None:
+                    readables = [key.fileobj for key, _ in
+                            sel.select(self._select_timeout(idle_time, stdin_eof))]
+                    can_recv = self.net in readables
+                    can_read_stdin = self.stdin in readables
 
                 # netin
-                try:
-                    net_data = self.recv(self.plen, blocking=False)
-                except (socket.error, OSError):
-                    return
-                if net_data:
-                    # stdout
+                net_data = None
+                received = 0
+                if can_recv and zerocopy_net is not None:
+                    # netin -> stdout inside the kernel.
                     try:
-                        # py3 write bytes
-                        self.stdout.buffer.write(net_data)
-                    except AttributeError:
-                        # py2 write bytes
-                        self.stdout.write(net_data)
-                    self.stdout.flush()
-                    idle_time = time.time()
+                        received = zerocopy_net(plen)
+                    except (socket.error, OSError):
+                        return
+                    if not received:
+                        net_data = b''
+                elif can_recv:
+                    try:
+                        net_data = recv(plen, blocking=blocking)
+                    except (socket.error, OSError):
+                        return
+                now = monotonic()
+                if received:
+                    idle_time = now
+                elif net_data:
+                    net_data, drained_eof, drained_error = self._drain(net_data, plen)
+                    # stdout
+                    stdout_write(net_data)
+                    if flush_each:
+                        stdout_flush()
+                    idle_time = now
+                    if drained_error is not None:
+                        # Same as recv failing, after writing
+                        # what came before the error.
+                        return
+                    if drained_eof:
+                        # netin EOF
+                        self.shutdown_rd()
+                        netin_eof = True
                 elif net_data is not None:
                     # netin EOF
                     self.shutdown_rd()
                     netin_eof = True
 
                 # stdin
-                if not self.d:
-                    try:
-                        # py3 read bytes
-                        stdin_data = self.stdin.buffer.read(self.plen)
-                    except AttributeError:
-                        # py2 read bytes
-                        stdin_data = self.stdin.read(self.plen)
+                if not d:
+                    stdin_data = None
+                    if can_read_stdin and zerocopy_stdin is not None:
+                        # stdin -> netout inside the kernel.
+                        try:
+                            sent = zerocopy_stdin(plen)
+                        except socket.error as e:
+                            if e.errno != errno.EPIPE:
+                                raise
+                            # Broken pipe.
+                            return
+                        if sent:
+                            idle_time = now
+                        else:
+                            # stdin EOF
+                            stdin_data = b''
+                    elif can_read_stdin:
+                        stdin_data = read_stdin(plen)
 
                     # netout
                     if stdin_data:
-                        if self.C:
+                        if C and b'\n' in stdin_data:
                             stdin_data = stdin_data.replace(b'\n', b'\r\n')
                         try:
-                            self.send(stdin_data)
+                            send(stdin_data)
                         except socket.error as e:
                             if e.errno != errno.EPIPE:
                                 # Not a broken pipe.
@@ -370,28 +597,159 @@ class NetcatConnection(NetcatContext):
                             # Broken pipe.
                             # netin connection lost
                             return
-                        idle_time = time.time()
-                    elif stdin_data is not None:
+                        idle_time = now
+                    elif stdin_data is not None or stdin_eof:
                         # stdin EOF
                         if not stdin_eof:
-                            stdin_eof = time.time()
+                            stdin_eof = now
+                            if sel is not None:
+                                # stdin stays readable at EOF.
+                                sel.unregister(self.stdin)
                         # If the user asked to exit on EOF, do it
-                        if self.q == 0:
+                        if q == 0:
                             self.shutdown_wr()
                             #self.stdin.close()
                         # If the user asked to die after a while, arrange for it
-                        if self.q > 0:
-                            stdin_eof_elapsed = time.time() - stdin_eof
-                            if stdin_eof_elapsed >= self.q:
+                        if q > 0:
+                            stdin_eof_elapsed = now - stdin_eof
+                            if stdin_eof_elapsed >= q:
                                 return
-                    
-                    if self.timeout is not None:
-                        idle_time_elapsed = time.time() - idle_time
-                        if idle_time_elapsed >= self.timeout:
+
+                    if timeout is not None:
+                        idle_time_elapsed = now - idle_time
+                        if idle_time_elapsed >= timeout:
                             return
-            except StopReadWrite:
-                # I/O has requested to stop the readwrite loop.
-                break
+        except StopReadWrite:
+            # I/O has requested to stop the readwrite loop.
+            pass
+        finally:
+            if sel is not None:
+                sel.close()
+            if not flush_each:
+                stdout_flush()
+
+    def _create_selector(self):
+        """
+        Return a selector with the network (and stdin unless detached)
+        registered for reading or None if they can't both be waited on.
+        """
+        if selectors is None or sys.platform == 'win32':
+            # select only works with sockets on Windows.
+            return None
+
+        if not self.d and self._is_regular_file(self.stdin):
+            # epoll refuses regular files and kqueue accepts them
+            # but may never report EOF, so read them without waiting.
+            return None
+
+        sel = selectors.DefaultSelector()
+        try:
+            sel.register(self.net, selectors.EVENT_READ)
+            if not self.d:
+                # Raises for objects without a usable fileno such as
+                # ConsoleInput or BytesIO.
+                sel.register(self.stdin, selectors.EVENT_READ)
+        except (AttributeError, KeyError, ValueError, OSError):
+            sel.close()
+            return None
+        return sel
+
+    def _stdin_zerocopy(self):
+        """
+        Return a function that moves up to n bytes from stdin to the
+        network without copying through Python, or None if lines need
+        rewriting (C) or stdin isn't a pipe (splice) or a regular file
+        (sendfile) the platform can do this for.
+        """
+        if self.C or self._stdin_fd is None:
+            return None
+        if type(self).send is not NetcatConnection.send:
+            # Don't bypass a sub-class's send.
+            return None
+        try:
+            if self.net.type != socket.SOCK_STREAM:
+                return None
+            netfd = self.net.fileno()
+            mode = os.fstat(self._stdin_fd).st_mode
+        except (AttributeError, ValueError, OSError):
+            return None
+
+        if stat.S_ISFIFO(mode) and hasattr(os, 'splice'):
+            return functools.partial(os.splice, self._stdin_fd, netfd)
+        if (stat.S_ISREG(mode) and hasattr(os, 'sendfile')
+                and sys.platform.startswith('linux')):
+            # Only Linux reads from the current file
+            # position when offset is None.
+            return functools.partial(os.sendfile, netfd, self._stdin_fd, None)
+        return None
+
+    def _net_zerocopy(self):
+        """
+        Return a function that moves up to n bytes from the network
+        to a stdout pipe without copying through Python, or None if
+        stdout isn't a pipe or the platform doesn't have splice.
+        """
+        if not hasattr(os, 'splice'):
+            return None
+        if type(self).recv is not NetcatConnection.recv:
+            # Don't bypass a sub-class's recv.
+            return None
+        stdout_fd = self._fileno(self.stdout)
+        if stdout_fd is None:
+            return None
+        try:
+            if self.net.type != socket.SOCK_STREAM:
+                return None
+            netfd = self.net.fileno()
+            if not stat.S_ISFIFO(os.fstat(stdout_fd).st_mode):
+                return None
+        except (AttributeError, ValueError, OSError):
+            return None
+        return functools.partial(os.splice, netfd, stdout_fd)
+
+    def _select_timeout(self, idle_time, stdin_eof):
+        """
+        Seconds until the idle (w) or quit (q) timeout expires.
+        None if neither applies.
+        """
+        now = compat.monotonic()
+        timeouts = []
+        if not self.d and self.timeout is not None:
+            timeouts.append(idle_time + self.timeout - now)
+        if stdin_eof and self.q > 0:
+            timeouts.append(stdin_eof + self.q - now)
+        if not timeouts:
+            return None
+        return max(0, min(timeouts))
+
+    def _read_stdin(self, n):
+        if self._stdin_fd is not None:
+            # Read straight from the file descriptor,
+            # skipping the buffered reader.
+            try:
+                return os.read(self._stdin_fd, n)
+            except OSError as e:
+                if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    raise
+                # Non-blocking stdin with nothing to read.
+                return None
+        return self._stdin_read(n)
+
+    def _is_regular_file(self, f):
+        fd = self._fileno(f)
+        if fd is None:
+            return False
+        try:
+            return stat.S_ISREG(os.fstat(fd).st_mode)
+        except OSError:
+            return False
+
+    def _fileno(self, f):
+        try:
+            return f.fileno()
+        except (AttributeError, ValueError, OSError):
+            # No file descriptor (ConsoleInput, BytesIO etc.)
+            return None
 
 
 class NetcatTCPConnection(NetcatConnection):
@@ -425,6 +783,7 @@ class NetcatTCPConnection(NetcatConnection):
         """
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.connect((dest, port))
+        _set_nodelay(sock)
         return cls(sock, **kwargs)
 
     @classmethod
@@ -456,13 +815,18 @@ class NetcatTCPConnection(NetcatConnection):
         server_sock.bind((dest, port))
         server_sock.listen(1)
 
-        # ctrl-c interrupt doesn't seem to break out of server accept.
-        # So using select for non-blocking server accept.
         while True:
-            readables, _, _ = select.select([server_sock], [], [], .002)
-            if server_sock in readables:
+            if not _wait_readable(server_sock):
+                continue
+            try:
                 sock, _ = server_sock.accept()
-                break
+            except socket.error as e:
+                if e.errno != errno.EINTR:
+                    raise
+                # py2, accept interrupted by a signal.
+                continue
+            break
+        _set_nodelay(sock)
 
         server_sock.close()
         return cls(sock, **kwargs)
@@ -515,13 +879,33 @@ class NetcatIterator(NetcatContext):
     '''
     Connection = None
     T = None
+    busy_poll = None
 
     allow_reuse_port = True
+    # Set to True in a sub-class to let several sockets bind the
+    # same port and have the kernel share incoming connections
+    # between them. Off by default so a second listener on a port
+    # in use fails instead of quietly taking some of its connections.
+    allow_reuse_port_kernel = False
+
+    v_buffer_autotune = 'Setting {optname} to {length} disables buffer autotuning'
 
-    def __init__(self, T=None, *args, **kwargs):
+    def __init__(self, T=None, busy_poll=None, *args, **kwargs):
         super(NetcatIterator, self).__init__(*args, **kwargs)
         if T is not None:
             self.T = T
+        if busy_poll is not None:
+            self.busy_poll = busy_poll
+
+        # Resolve the TOS keyword once rather than per socket.
+        self._tos = None
+        if self.T is not None:
+            self._tos = int(TOSKEYWORDS.get(self.T, self.T))
+
+        # getaddrinfo results by (addr, port), so a client looking up
+        # the same proxy or source address for every port only does
+        # it once.
+        self._addrinfo_cache = dict()
 
     def _init_kwargs(self, **kwargs):
         self._conn_kwargs = kwargs
@@ -540,10 +924,7 @@ class NetcatIterator(NetcatContext):
     @property
     def tos(self):
         ''' Returns IP TOS integer value. '''
-        T = self.T
-        if T in TOSKEYWORDS:
-            T = TOSKEYWORDS[T]
-        return int(T)
+        return self._tos
 
     def iter_connections(self):
         ''' Override in subclass
@@ -565,26 +946,61 @@ class NetcatIterator(NetcatContext):
     def _set_common_sockopts(self, sock):
         if self.allow_reuse_port:
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.allow_reuse_port_kernel:
+            _set_reuseport(sock)
         if self.b:
-            sock.setsockopt(socket.IPPROTO_TCP, socket.SO_BROADCAST, 1)
+            if self.socket_type == socket.SOCK_DGRAM:
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+            else:
+                self.print_debug('Broadcast is only supported with UDP, ignoring -b')
         if self.D:
             sock.setsockopt(socket.SOL_SOCKET, socket.SO_DEBUG, 1)
         if self.T:
-            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, self.tos)
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, self._tos)
         if self.I:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.I)
+            self._set_buffer_sockopt(sock, 'SO_RCVBUF', self.I)
         if self.O:
-            sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.O)
+            self._set_buffer_sockopt(sock, 'SO_SNDBUF', self.O)
+        if self.socket_type == socket.SOCK_STREAM:
+            _set_nodelay(sock)
+        if self.busy_poll:
+            if sys.platform.startswith('linux'):
+                try:
+                    sock.setsockopt(socket.SOL_SOCKET, SO_BUSY_POLL, self.busy_poll)
+                except socket.error as e:
+                    # e.g. EPERM raising it without CAP_NET_ADMIN.
+                    raise NetcatSocketError(e)
+            else:
+                self.print_verbose('Busy polling is only supported on Linux, ignoring --busy-poll')
+
+    def _set_buffer_sockopt(self, sock, optname, length):
+        # Linux and Windows size socket buffers automatically
+        # to fit the link (bandwidth * RTT). Setting a length
+        # turns that off for this socket, so only do it when
+        # asked to and warn about it.
+        if sys.platform.startswith('linux') or sys.platform == 'win32':
+            self.print_verbose(self.v_buffer_autotune.format(
+                optname=optname,
+                length=length,
+            ))
+        sock.setsockopt(socket.SOL_SOCKET, getattr(socket, optname), length)
 
     def _getaddrinfo(self, addr, port):
+        key = (addr, port)
+        try:
+            return self._addrinfo_cache[key]
+        except KeyError:
+            pass
         # Used to raise socket error on bad address.
         try:
-            return socket.getaddrinfo(
+            addrinfo = socket.getaddrinfo(
                     addr, port,
                     self.address_family, 0, 0, self.flags,
             )
         except socket.error as e:
             raise NetcatSocketError(e)
+        self._addrinfo_cache[key] = addrinfo
+        return addrinfo
 
 
 class NetcatClient(NetcatIterator):
@@ -645,6 +1061,12 @@ class NetcatClient(NetcatIterator):
 
     v_conn_succeeded = 'Connection to {dest} {port} port [{proto_name}/{proto}] succeeded!'
     v_conn_refused = 'connect to {dest} port {port} ({proto_name}) failed: Connection refused'
+    v_conn_failed = 'connect to {dest} port {port} ({proto_name}) failed: {error}'
+
+    scan_width = 256
+    # File descriptors left for everything else while a batch
+    # of scan sockets is open.
+    scan_fd_headroom = 32
 
     _4 = True
     _6 = False
@@ -715,6 +1137,7 @@ class NetcatClient(NetcatIterator):
         self.flags = 0
         if self.n:
             self.flags = socket.AI_NUMERICHOST
+        self._dest_sockaddr = None
 
     @property
     def proxy_protocol(self):
@@ -753,6 +1176,23 @@ class NetcatClient(NetcatIterator):
         return self.w
 
     def iter_connections(self):
+        if self.z and self._can_scan_batch():
+            # Zero i/o scan, connect to many ports at a time.
+            width = self._scan_batch_width()
+            pending = []
+            while True:
+                ports = pending + list(itertools.islice(
+                        self._iterports, width - len(pending)))
+                if not ports:
+                    return
+                pending = self._scan_batch(ports)
+
+        if self.z and self._can_scan_port():
+            # Zero i/o scan, one port at a time.
+            for port in self._iterports:
+                self._scan_port(port)
+            return
+
         while True:
             try:
                 nc_conn = self.next_connection()
@@ -781,11 +1221,142 @@ class NetcatClient(NetcatIterator):
         )
         raise ConnectionRefused(self.dest, port)
 
+    def _conn_failed(self, port, err, dest=None):
+        if dest is None:
+            dest = self.dest
+        self.print_verbose(
+                self.v_conn_failed.format(
+                    dest=dest, port=port,
+                    proto_name=self.protocol_name,
+                    error=os.strerror(err),
+                ),
+        )
+
+    def _can_scan_port(self):
+        # Proxy errors are reported with exceptions.
+        # UDP needs probing after connect.
+        return self.socket_type == socket.SOCK_STREAM and not self.x
+
+    def _can_scan_batch(self):
+        # A fixed source port (-p) can only connect once at a time.
+        return (selectors is not None
+                and self._can_scan_port()
+                and not self.p)
+
+    def _scan_batch_width(self):
+        """
+        Number of ports to scan at a time, kept under the open file
+        limit (which is as low as 256 by default on macOS).
+        """
+        width = self.scan_width
+        if resource is None:
+            return width
+        try:
+            soft, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+        except (ValueError, OSError):
+            return width
+        if soft == resource.RLIM_INFINITY:
+            return width
+        return max(1, min(width, soft - self.scan_fd_headroom))
+
+    def _scan_batch(self, ports):
+        """
+        Start a non-blocking connect to each port, wait for them all
+        to connect, fail or time out then report each port in order.
+        Returns the ports there weren't enough file descriptors left
+        to start, to go in the next batch.
+        """
+        try:
+            sel = selectors.DefaultSelector()
+        except (socket.error, OSError) as e:
+            raise NetcatSocketError(e)
+        socks_ = []
+        results = dict()
+        pending = []
+        try:
+            for i, port in enumerate(ports):
+                addr = self._dest_addr(port)
+                try:
+                    sock = self._client_init()
+                except (socket.error, OSError) as e:
+                    if e.errno in (errno.EMFILE, errno.ENFILE) and i > 0:
+                        # Out of file descriptors, scan the rest
+                        # once this batch's sockets are closed.
+                        pending = ports[i:]
+                        ports = ports[:i]
+                        break
+                    raise NetcatSocketError(e)
+                socks_.append(sock)
+                try:
+                    self._client_bind(sock)
+                    sock.setblocking(False)
+                    err = sock.connect_ex(addr)
+                except (socket.error, OSError) as e:
+                    raise NetcatSocketError(e)
+                if err in _CONNECT_IN_PROGRESS:
+                    sel.register(sock, selectors.EVENT_WRITE, port)
+                else:
+                    results[port] = err
+
+            deadline = None
+            if self.timeout:
+                deadline = compat.monotonic() + self.timeout
+            while sel.get_map():
+                timeout = None
+                if deadline is not None:
+                    timeout = max(0, deadline - compat.monotonic())
+                events = sel.select(timeout)
+                if not events:
+                    # Timed out waiting for the rest.
+                    break
+                for key, _ in events:
+                    sel.unregister(key.fileobj)
+                    results[key.data] = key.fileobj.getsockopt(
+                            socket.SOL_SOCKET, socket.SO_ERROR)
+        finally:
+            sel.close()
+            for sock in socks_:
+                sock.close()
+
+        for port in ports:
+            self._scan_result(port, results.get(port, errno.ETIMEDOUT))
+        return pending
+
+    def _scan_port(self, port):
+        """
+        Zero i/o connect to one port, checking the connect_ex error
+        code instead of raising and catching exceptions.
+        """
+        addr = self._dest_addr(port)
+        sock = self._client_init()
+        try:
+            self._client_bind(sock)
+            if self.timeout:
+                sock.settimeout(self.timeout)
+            err = sock.connect_ex(addr)
+        finally:
+            sock.close()
+        if err in _CONNECT_IN_PROGRESS:
+            # connect_ex returns EAGAIN when settimeout times out.
+            err = errno.ETIMEDOUT
+        self._scan_result(port, err)
+
+    def _scan_result(self, port, err):
+        if err in (0, errno.EISCONN):
+            self._conn_succeeded(port)
+        elif err == errno.ECONNREFUSED:
+            try:
+                self._conn_refused(port)
+            except ConnectionRefused:
+                pass
+        else:
+            self._conn_failed(port, err)
+
     def next_connection(self):
         # This will raise StopIteration when no more ports.
         port = next(self._iterports)
         try:
-            nc_conn = self._create_connection((self.dest, port))
+            nc_conn = self._create_connection(self._dest_addr(port))
         except compat.ConnectionRefusedError:
             self._conn_refused(port)
         except socks.ProxyError as e:
@@ -812,10 +1383,7 @@ class NetcatClient(NetcatIterator):
             dest = self.dest
         proto = '*'
         if not self.n:
-            try:
-                proto = socket.getservbyport(port, self.protocol_name)
-            except (socket.error, OSError):
-                pass
+            proto = _getservbyport(port, self.protocol_name) or proto
         self.print_verbose(
                 self.v_conn_succeeded.format(
                     dest=dest,
@@ -825,9 +1393,22 @@ class NetcatClient(NetcatIterator):
                 ),
         )
     
+    def _dest_addr(self, port):
+        """
+        Return the address to connect to for port.
+        dest is only resolved once, not for every port.
+        """
+        if self._dest_sockaddr is None:
+            # Used to raise socket error on bad address.
+            addrinfo = self._getaddrinfo(self.dest, 0)
+            self._dest_sockaddr = addrinfo[0][4]
+        if self.x:
+            # Let the proxy connect to dest.
+            return (self.dest, port)
+        # IPv6 addresses have flowinfo and scope_id after the port.
+        return self._dest_sockaddr[:1] + (port,) + self._dest_sockaddr[2:]
+
     def _create_connection(self, addr):
-        dest, port = addr
-        addrinfo = self._getaddrinfo(dest, port)
         sock = self._client_init()
         self._client_bind(sock)
         self._client_connect(sock, addr)
@@ -896,10 +1477,24 @@ class NetcatUDPClient(NetcatClient):
         if timeout is None:
             timeout = self.udp_scan_timeout
 
+        if selectors is None:
+            # py2
+            # Give the remote host some time to reply.
+            for i in compat.range(0, timeout):
+                time.sleep(1)
+                sock.sendall(b'X')
+            return
+
         # Give the remote host some time to reply.
-        for i in compat.range(0, timeout):
-            time.sleep(1)
-            sock.sendall(b'X')
+        # Stop waiting as soon as it replies or an ICMP
+        # port unreachable error comes back.
+        with selectors.DefaultSelector() as sel:
+            sel.register(sock, selectors.EVENT_READ)
+            if not sel.select(timeout):
+                return
+        err = sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR)
+        if err:
+            raise socket.error(err, os.strerror(err))
 
 
 class NetcatServer(NetcatIterator):
@@ -919,6 +1514,10 @@ class NetcatServer(NetcatIterator):
     :param k: Set to True to keep the server open between connections.
     :type k: bool, optional
 
+    :param workers: With k, the number of processes accepting and
+        serving connections at the same time (TCP, POSIX only).
+    :type workers: int, optional
+
     :param kwargs: Any other keyword arguments get passed to each
         connection.
 
@@ -965,9 +1564,10 @@ class NetcatServer(NetcatIterator):
     k = False
     n = False
     O = None
+    workers = 1
 
     def __init__(self, port, dest='', _4=None, _6=None, b=None,
-            D=None, I=None, k=None, n=None, O=None, **kwargs):
+            D=None, I=None, k=None, n=None, O=None, workers=None, **kwargs):
         super(NetcatServer, self).__init__(**kwargs)
 
         self.dest = dest
@@ -976,12 +1576,11 @@ class NetcatServer(NetcatIterator):
             # set to 0.0.0.0 to listen on all interfaces.
             self.dest = '0.0.0.0'
 
-        self.port = port
-        if not isinstance(port, int) and not isinstance(port, str):
-            # port is not an int or a string.
-            # getaddrinfo expects an int or string.
-            # All objects have __repr__ so call repr to get string.
-            self.port = repr(port)
+        try:
+            self.port = int(port)
+        except (TypeError, ValueError):
+            # e.g. a port range, a server can only bind to one port.
+            raise NetcatError('invalid port value: {!r}'.format(port))
 
         if _4 is not None:
             self._4 = _4
@@ -999,6 +1598,8 @@ class NetcatServer(NetcatIterator):
             self.n = n
         if O is not None:
             self.O = O
+        if workers is not None:
+            self.workers = workers
 
         if _6:
             self.address_family = socket.AF_INET6
@@ -1007,6 +1608,7 @@ class NetcatServer(NetcatIterator):
             self.flags = socket.AI_NUMERICHOST
 
         self._sock = socket.socket(self.address_family, self.socket_type)
+        self._create_wakeup()
 
         bind_and_activate = True
         if bind_and_activate:
@@ -1055,10 +1657,7 @@ class NetcatServer(NetcatIterator):
     def _conn_accepted(self, cli_dest, cli_port):
         proto = '*'
         if not self.n:
-            try:
-                proto = socket.getservbyport(self.port, self.protocol_name)
-            except (socket.error, OSError):
-                pass
+            proto = _getservbyport(self.port, self.protocol_name) or proto
         self.print_verbose(self.v_conn_accepted.format(
             dest=cli_dest,
             port=self.port,
@@ -1068,16 +1667,95 @@ class NetcatServer(NetcatIterator):
             sport=cli_port,
         ))
 
+    def _create_wakeup(self):
+        """
+        A blocking accept/recv isn't woken up when the server is
+        closed from another thread. So on POSIX wait for the socket
+        and a pipe that closing the server writes to.
+        """
+        self._wake_r = self._wake_w = self._wake_sel = None
+        if sys.platform == 'win32':
+            # _wait_readable polls, which notices the close.
+            return
+        self._wake_lock = threading.Lock()
+        self._waiting = False
+        self._wake_r, self._wake_w = os.pipe()
+        if selectors is not None:
+            self._wake_sel = selectors.DefaultSelector()
+            self._wake_sel.register(self._sock, selectors.EVENT_READ)
+            self._wake_sel.register(self._wake_r, selectors.EVENT_READ)
+
+    def _close_wakeup(self):
+        if self._wake_w is None:
+            return
+        with self._wake_lock:
+            if self._wake_w is None:
+                return
+            # EOF on the read end wakes up a waiting thread.
+            os.close(self._wake_w)
+            self._wake_w = None
+            if not self._waiting:
+                self._release_wakeup()
+            # Otherwise the waiting thread releases the rest,
+            # closing it under a thread in select doesn't wake it.
+
+    def _release_wakeup(self):
+        if self._wake_sel is not None:
+            self._wake_sel.close()
+        os.close(self._wake_r)
+        self._wake_r = self._wake_sel = None
+
+    def _wait_request(self):
+        """
+        Wait for a connection/datagram.
+        Raises ValueError or socket.error if the server is closed.
+        """
+        if sys.platform == 'win32':
+            return _wait_readable(self._sock)
+
+        with self._wake_lock:
+            if self._wake_w is None:
+                raise ValueError('server is closed')
+            self._waiting = True
+            wake_r, wake_sel = self._wake_r, self._wake_sel
+        try:
+            if wake_sel is not None:
+                # py3
+                readables = [key.fileobj for key, _ in wake_sel.select()]
+            else:
+                # py2
+                try:
+                    readables, _, _ = select.select([self._sock, wake_r], [], [])
+                except select.error as e:
+                    if e.args[0] != errno.EINTR:
+                        raise ValueError(e)
+                    return False
+        finally:
+            with self._wake_lock:
+                self._waiting = False
+                if self._wake_w is None and self._wake_r is not None:
+                    # Closed while waiting.
+                    self._release_wakeup()
+        if wake_r in readables:
+            raise ValueError('server is closed')
+        return self._sock in readables
+
     def next_connection(self):
         while True:
             try:
-                can_read, _, _ = select.select([self._sock], [], [], .002)
-            except (ValueError, socket.error):
+                can_read = self._wait_request()
+            except (ValueError, socket.error, OSError):
                 # Bad / closed socket.
                 # This can occur when the server is closed.
                 raise StopIteration
-            if self._sock in can_read:
-                cli_sock, cli_addr = self._get_request()
+            if can_read:
+                try:
+                    cli_sock, cli_addr = self._get_request()
+                except socket.error as e:
+                    if e.errno != errno.EINTR:
+                        raise
+                    # py2, accept interrupted by a signal.
+                    continue
                 try:
                     # IPv4
                     cli_dest, cli_port = cli_addr
@@ -1090,7 +1768,11 @@ class NetcatServer(NetcatIterator):
         return nc_conn
 
     def _server_bind(self):
-        addrinfo = self._getaddrinfo(self.dest, self.port)
+        if not _is_ip_literal(self.dest):
+            # Used to raise socket error on bad address.
+            # An IP address has nothing to look up, a bad
+            # one still fails at bind.
+            addrinfo = self._getaddrinfo(self.dest, self.port)
         self._set_common_sockopts(self._sock)
         try:
             self._sock.bind((self.dest, self.port))
@@ -1101,6 +1783,7 @@ class NetcatServer(NetcatIterator):
         pass
 
     def _server_close(self):
+        self._close_wakeup()
         self._sock.close()
 
     def _get_request(self):
@@ -1130,6 +1813,14 @@ class NetcatTCPServer(NetcatServer):
     address_family = socket.AF_INET
     socket_type = socket.SOCK_STREAM
     request_queue_size = 1
+    # Queue connects that arrive while another
+    # connection is being served with -k.
+    keep_open_queue_size = socket.SOMAXCONN
+
+    v_workers_unsupported = 'Worker processes need os.fork, using one worker'
+    e_workers_thread = 'worker processes can only be started from the main thread'
+    e_workers_fileno = 'worker processes need stdout (and stdin unless -d) to be real files'
+    e_workers_failed = 'unable to start worker processes: {}'
 
     def next_connection(self):
         nc_conn = super(NetcatTCPServer, self).next_connection()
@@ -1138,10 +1829,148 @@ class NetcatTCPServer(NetcatServer):
         return nc_conn
 
     def _server_activate(self):
-        self._sock.listen(self.request_queue_size)
+        if self.k:
+            self._sock.listen(self.keep_open_queue_size)
+        else:
+            self._sock.listen(self.request_queue_size)
 
     def _get_request(self):
-        return self._sock.accept()
+        cli_sock, cli_addr = self._sock.accept()
+        # Not every platform copies TCP_NODELAY from
+        # the listening socket to accepted sockets.
+        _set_nodelay(cli_sock)
+        return cli_sock, cli_addr
+
+    def readwrite(self):
+        if not (self.k and self.workers > 1):
+            return super(NetcatTCPServer, self).readwrite()
+
+        if not hasattr(os, 'fork'):
+            self.print_verbose(self.v_workers_unsupported)
+            return super(NetcatTCPServer, self).readwrite()
+        self._check_workers()
+
+        # Fork the extra workers after listen() so they all accept
+        # from the one listening socket. The kernel hands each
+        # connection to one idle worker, and a worker busy with a
+        # long connection doesn't hold up the ones queued behind it.
+        #
+        # Each worker gets the read end of a pipe that only the
+        # parent can write to. However the parent goes away, even
+        # SIGKILL, the pipe hits EOF and the workers go with it.
+        try:
+            alive_r, alive_w = os.pipe()
+        except OSError as e:
+            raise NetcatError(self.e_workers_failed.format(e))
+        pids = []
+        try:
+            in_worker = self._fork_workers(alive_w, pids)
+        except OSError as e:
+            # e.g. EAGAIN, stop the ones that did start.
+            os.close(alive_r)
+            os.close(alive_w)
+            self._stop_workers(pids)
+            raise NetcatError(self.e_workers_failed.format(e))
+        if in_worker:
+            self._run_worker(alive_r)
+        os.close(alive_r)
+        try:
+            super(NetcatTCPServer, self).readwrite()
+        finally:
+            os.close(alive_w)
+            self._stop_workers(pids)
+
+    def _check_workers(self):
+        try:
+            # py3
+            in_main_thread = threading.current_thread() is threading.main_thread()
+        except AttributeError:
+            # py2
+            in_main_thread = isinstance(threading.current_thread(), threading._MainThread)
+        if not in_main_thread:
+            # Only the forking thread exists in the child,
+            # locks held by any other thread stay locked.
+            raise NetcatError(self.e_workers_thread)
+
+        # Each worker has its own copy of in-memory files
+        # and anything written to them would be lost.
+        files = [self.stdout]
+        if not self._conn_kwargs.get('d'):
+            files.append(self.stdin)
+        for f in files:
+            try:
+                f.fileno()
+            except (AttributeError, ValueError, OSError):
+                raise NetcatError(self.e_workers_fileno)
+
+    def _fork_workers(self, alive_w, pids):
+        """
+        Fork workers-1 processes, adding each pid to pids as it
+        starts so they can be stopped if a later fork fails.
+        Returns True in a worker and False in the parent.
+        """
+        # Don't let the workers inherit unflushed output.
+        self.stdout.flush()
+        self.stderr.flush()
+        for _ in compat.range(self.workers - 1):
+            pid = os.fork()
+            if pid == 0:
+                os.close(alive_w)
+                return True
+            pids.append(pid)
+        return False
+
+    def _watch_parent(self, alive_r):
+        # Returns on EOF, when the parent has closed its end
+        # or exited.
+        while True:
+            try:
+                if not os.read(alive_r, 1):
+                    break
+            except OSError as e:
+                if e.errno != errno.EINTR:
+                    break
+        os._exit(0)
+
+    def _run_worker(self, alive_r):
+        # Don't share the parent's wakeup pipe, closing one
+        # process's server shouldn't stop the others.
+        os.close(self._wake_w)
+        self._release_wakeup()
+        self._create_wakeup()
+
+        watcher = threading.Thread(target=self._watch_parent, args=(alive_r,))
+        watcher.daemon = True
+        watcher.start()
+
+        status = 0
+        try:
+            super(NetcatTCPServer, self).readwrite()
+        except KeyboardInterrupt:
+            pass
+        except NetcatError as e:
+            self._print_message(str(e))
+            status = 1
+        finally:
+            try:
+                self.stdout.flush()
+                self.stderr.flush()
+            finally:
+                # Never return into the parent's code.
+                os._exit(status)
+
+    def _stop_workers(self, pids):
+        for pid in pids:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                # Already exited.
+                pass
+        for pid in pids:
+            try:
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
 
 
 class NetcatUDPServer(NetcatServer):
@@ -1155,14 +1984,21 @@ class NetcatUDPServer(NetcatServer):
     socket_type = socket.SOCK_DGRAM
     max_packet_size = 8192
 
+    _recv_buf = None
+
     def _get_request(self):
-        data, addr = self._sock.recvfrom(self.max_packet_size)
+        if self._recv_buf is None:
+            # Requests are received one at a time,
+            # so one buffer can be reused for each.
+            self._recv_buf = bytearray(self.max_packet_size)
+        n, addr = self._sock.recvfrom_into(self._recv_buf, self.max_packet_size)
+        data = memoryview(self._recv_buf)[:n]
         try:
             # py3
             self.stdout.buffer.write(data)
         except AttributeError:
             # py2
-            self.stdout.write(data)
+            self.stdout.write(data.tobytes())
 
         self._sock.connect(addr)
         return self._sock, addr
@@ -1178,11 +2014,45 @@ class StopReadWrite(Exception):
     """
 
 
+class NetcatPortRanges(object):
+    """
+    Iterates through the ports in a sorted list of port ranges.
+
+    The ranges are kept as two arrays, one of starts and one of
+    stops, instead of a list of range objects.
+    """
+
+    def __init__(self, ranges):
+        # str() because array won't take a unicode typecode on py2.
+        self.starts = array.array(str('H'))
+        # A stop is one past the last port and can be 65536,
+        # which doesn't fit in an unsigned short.
+        self.stops = array.array(str('I'))
+        for r in ranges:
+            self.starts.append(r.start)
+            self.stops.append(r.stop)
+
+    def __iter__(self):
+        # Only one range object per range is made here,
+        # the ports themselves are iterated over in C.
+        return itertools.chain.from_iterable(
+                map(compat.range, self.starts, self.stops))
+
+    def __len__(self):
+        return sum(self.stops) - sum(self.starts)
+
+    def __repr__(self):
+        ranges = ', '.join('{}-{}'.format(start, stop-1)
+                for start, stop in zip(self.starts, self.stops))
+        return '{}([{}])'.format(type(self).__name__, ranges)
+
+
 class NetcatPortAction(argparse.Action):
 
     def __call__(self, parser, namespace, values, option_string=None):
         # If one port is given on the command line, set that as value.
-        # If more that one is given, sort and chain as one iterator.
+        # If more that one is given, sort them and set an iterable
+        # of all the ports.
 
         if not values:
             return
@@ -1194,9 +2064,7 @@ class NetcatPortAction(argparse.Action):
 
         # sort the list of port ranges.
         sorted_values = sorted(values, key=lambda r: r.start)
-        # chain the port ranges into one iter.
-        chained_values = itertools.chain(*sorted_values)
-        setattr(namespace, self.dest, chained_values)
+        setattr(namespace, self.dest, NetcatPortRanges(sorted_values))
         return
 
 
@@ -1205,13 +2073,21 @@ class NetcatArgumentParser(GroupingArgumentParser):
     usage = ("%(prog)s [-46bCDdhklnruvz] [-I length] [-i interval] [-O length]"
             "\n\t    [-P proxy_username] [-p source_port] [-q seconds]"
             "\n\t    [-s source] [-T toskeyword] [-w timeout] [-X proxy_protocol]"
-            "\n\t    [-x proxy_address[:port]] [dest] [port]")
+            "\n\t    [-x proxy_address[:port]] [--busy-poll usecs] [--workers N]"
+            "\n\t    [dest] [port]")
     description = 'arbitrary TCP and UDP connections and listens (Netcat for Python).'
     add_help = False
     
     PortAction = NetcatPortAction
 
+    # Raise NetcatArgumentError on bad arguments instead of
+    # printing the usage and exiting.
+    raise_on_error = False
+
     def __init__(self, *args, **kwargs):
+        raise_on_error = kwargs.pop('raise_on_error', None)
+        if raise_on_error is not None:
+            self.raise_on_error = raise_on_error
         super(NetcatArgumentParser, self).__init__(*args, **kwargs)
 
         self.add_argument('-4',
@@ -1252,7 +2128,7 @@ class NetcatArgumentParser(GroupingArgumentParser):
         )
 
         self.add_argument('-I',
-                help='TCP receive buffer length',
+                help='TCP receive buffer length (disables autotuning)',
                 metavar='length',
                 type=int,
         )
@@ -1281,7 +2157,7 @@ class NetcatArgumentParser(GroupingArgumentParser):
         )
 
         self.add_argument('-O',
-                help='TCP send buffer length',
+                help='TCP send buffer length (disables autotuning)',
                 metavar='length',
                 type=int,
         )
@@ -1359,6 +2235,20 @@ class NetcatArgumentParser(GroupingArgumentParser):
                 action='store_true',
         )
 
+        self.add_argument('--busy-poll',
+                help='Busy poll for incoming data for usecs (Linux only)',
+                metavar='usecs',
+                type=self.usecs,
+                dest='busy_poll',
+        )
+
+        self.add_argument('--workers',
+                group='server arguments',
+                help='Serve -k connections with N processes (TCP only)',
+                metavar='N',
+                type=int,
+        )
+
         self.add_argument('dest',
                 help='The destination host name or ip to connect or bind to',
                 nargs='?',
@@ -1383,14 +2273,23 @@ class NetcatArgumentParser(GroupingArgumentParser):
             raise ValueError('timeout too small')
         return value
 
+    def usecs(self, value):
+        value = int(value)
+        if value < 0:
+            raise ValueError('usecs too small')
+        if value > 0x7fffffff:
+            # setsockopt takes a C int.
+            raise ValueError('usecs too large')
+        return value
+
     def toskeyword(self, value):
-        if value in TOSKEYWORDS:
-            return TOSKEYWORDS[value]
-        try:
-            value = int(value)
-        except ValueError:
-            # value might be a hex number.
-            value = int(value, 16)
+        tos = TOSKEYWORDS.get(value)
+        if tos is not None:
+            return tos
+        # Anything int() wouldn't read as decimal might be a hex
+        # number, with or without the 0x prefix.
+        decimal = value.strip().lstrip('+-').replace('_', '').isdigit()
+        value = int(value, 10 if decimal else 16)
         if 0 <= value <= 255:
             return value
         raise ValueError('illegal tos value {}'.format(value))
@@ -1410,6 +2309,14 @@ class NetcatArgumentParser(GroupingArgumentParser):
         # ranges if more than one port is given.
 
         msg = 'invalid port value: {}'
+        if value.isdigit():
+            # single port, the common case.
+            # e.g 8000
+            value = int(value)
+            if not self._valid_port(value):
+                raise ValueError(msg.format(value))
+            return compat.range(value, value+1)
+
         try:
             # assume port value is a range.
             # e.g 8000-8005
@@ -1430,6 +2337,17 @@ class NetcatArgumentParser(GroupingArgumentParser):
 
         return compat.range(start_port, end_port+1)
 
+    def error(self, message):
+        if self.raise_on_error:
+            raise NetcatArgumentError(message)
+        super(NetcatArgumentParser, self).error(message)
+
+    def _usage_error(self, message):
+        if self.raise_on_error:
+            raise NetcatArgumentError(message)
+        self.print_usage()
+        self.exit()
+
     def parse_args(self, args):
         grouped_args = self.group_parse_args(args)
 
@@ -1444,14 +2362,17 @@ class NetcatArgumentParser(GroupingArgumentParser):
                 pass
             elif args.dest and not args.port and not args.p:
                 # pync -l 8000
-                # Get the port from args.dest.
-                # This will need feeding through the parser
-                # again to detect any port number errors.
-                args.port = args.dest
+                # Get the port from args.dest, checking it the
+                # same way the parser checks the port argument.
+                try:
+                    ports = self.port(args.dest)
+                except ValueError:
+                    self.error('argument port: invalid port value: {!r}'.format(args.dest))
+                if ports.start == (ports.stop - 1):
+                    args.port = ports.start
+                else:
+                    args.port = NetcatPortRanges([ports])
                 args.dest = ''
-                test_args = ['dest', args.port]
-                test_args = self.group_parse_args(test_args)['general arguments']
-                args.port = test_args.port
             elif not args.dest and not args.port and args.p:
                 # pync -lp 8000
                 pass
@@ -1462,8 +2383,10 @@ class NetcatArgumentParser(GroupingArgumentParser):
                 # pync -lp 8000 localhost 8001
                 pass
             else:
-                self.print_usage()
-                self.exit()
+                self._usage_error('a port to listen on is required')
+            if isinstance(args.port, NetcatPortRanges):
+                # e.g pync -l 8000-8002
+                self.error('argument port: can only listen on one port')
         else:
             # Client mode.
             if args.dest and args.port:
@@ -1473,8 +2396,7 @@ class NetcatArgumentParser(GroupingArgumentParser):
                 # pync -p 1234 localhost 8000
                 pass
             else:
-                self.print_usage()
-                self.exit()
+                self._usage_error('dest and port are required')
 
         kwargs = dict()
         kwargs.update(vars(args))
@@ -1645,7 +2567,7 @@ class Netcat(object):
 
         try:
             # Assume args is a string and try to split it.
-            args = shlex.split(args)
+            args = _split_args(args)
         except AttributeError:
             # args is not a string, assume it's a list.
             pass
@@ -1724,6 +2646,7 @@ def pync(args, stdin=None, stdout=None, stderr=None, Netcat=Netcat):
 
     class PyncTCPClient(Netcat.TCPClient):
         v_conn_refused = 'pync: ' + Netcat.TCPClient.v_conn_refused
+        v_conn_failed = 'pync: ' + Netcat.TCPClient.v_conn_failed
 
         def _conn_succeeded(self, port):
             super(PyncTCPClient, self)._conn_succeeded(port)
@@ -1739,6 +2662,7 @@ def pync(args, stdin=None, stdout=None, stderr=None, Netcat=Netcat):
 
     class PyncUDPClient(Netcat.UDPClient):
         v_conn_refused = 'pync: ' + Netcat.UDPClient.v_conn_refused
+        v_conn_failed = 'pync: ' + Netcat.UDPClient.v_conn_failed
         
         def _conn_succeeded(self, port):
             super(PyncUDPClient, self)._conn_succeeded(port)
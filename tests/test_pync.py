@@ -1,14 +1,25 @@
 # -*- coding: utf-8 -*-
 
 import io
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
 
 import pytest
 
-from pync import pync
+from pync import pync, Netcat, NetcatArgumentParser
+from pync import NetcatTCPServer, NetcatUDPServer
+from pync.netcat import NetcatArgumentError
 from .server import PyncServer
 
 SERVER_PORT = 8000
 HELLO_WORLD = b'Hello, World!\n'
+# Bigger than a pipe buffer and a single read.
+BIG_DATA = os.urandom(1024 * 1024)
 
 
 @pytest.fixture
@@ -53,3 +64,224 @@ def test_tcp_download(hello_server):
     stdout.seek(0)
     assert stdout.read() == HELLO_WORLD
 
+
+@pytest.fixture
+def big_server():
+    server = PyncServer(
+            port=SERVER_PORT,
+            stdin=io.BytesIO(BIG_DATA))
+    server.start()
+    server.ready_event.wait()
+    return server
+
+
+def test_tcp_download_big(big_server):
+    # A small read length leaves data queued on the socket
+    # to be drained into stdout with each read.
+    stdout = io.BytesIO()
+    with Netcat('localhost', SERVER_PORT, d=True, plen=1024,
+            stdout=stdout, stderr=io.StringIO()) as nc:
+        nc.readwrite()
+    assert stdout.getvalue() == BIG_DATA
+
+
+def test_tcp_download_pipe(big_server, monkeypatch):
+    # A stdout pipe can be spliced into from the socket.
+    splice = getattr(os, 'splice', None)
+    spliced = []
+    if splice is not None:
+        def counting_splice(*args, **kwargs):
+            spliced.append(args)
+            return splice(*args, **kwargs)
+        monkeypatch.setattr(os, 'splice', counting_splice)
+
+    rfd, wfd = os.pipe()
+    received = []
+    def read_pipe():
+        with os.fdopen(rfd, 'rb') as f:
+            received.append(f.read())
+    reader = threading.Thread(target=read_pipe)
+    reader.start()
+
+    with os.fdopen(wfd, 'wb') as stdout:
+        ret = pync('-d localhost {}'.format(SERVER_PORT),
+                stdout=stdout,
+                stderr=io.StringIO())
+    reader.join(5)
+    assert ret == 0
+    assert received == [BIG_DATA]
+    if splice is not None:
+        assert spliced
+
+
+def test_tcp_upload_pipe(server):
+    # A pipe can be waited on with the readwrite selector
+    # unlike an in-memory stdin.
+    rfd, wfd = os.pipe()
+    os.write(wfd, HELLO_WORLD)
+    os.close(wfd)
+    with os.fdopen(rfd, 'rb') as stdin:
+        ret = pync('localhost {}'.format(SERVER_PORT),
+                stdin=stdin,
+                stdout=io.BytesIO(),
+                stderr=io.StringIO())
+    assert ret == 0
+
+    server.join(5)
+    server.stdout.seek(0)
+    assert server.stdout.read() == HELLO_WORLD
+
+
+def test_tcp_scan(server):
+    # Zero i/o scan of an open and a closed port.
+    stderr = io.StringIO()
+    ret = pync('-z -v localhost {}-{}'.format(SERVER_PORT, SERVER_PORT+1),
+            stdout=io.BytesIO(),
+            stderr=stderr)
+    assert ret == 0
+
+    lines = stderr.getvalue().splitlines()
+    assert len(lines) == 2
+    assert 'localhost {} port'.format(SERVER_PORT) in lines[0]
+    assert lines[0].endswith('succeeded!')
+    assert 'port {} (tcp) failed'.format(SERVER_PORT+1) in lines[1]
+
+
+def test_tcp_upload_file(server, tmp_path):
+    # Upload a regular file.
+    path = tmp_path / 'hello.txt'
+    path.write_bytes(HELLO_WORLD)
+    with path.open('rb') as stdin:
+        ret = pync('localhost {}'.format(SERVER_PORT),
+                stdin=stdin,
+                stdout=io.BytesIO(),
+                stderr=io.StringIO())
+    assert ret == 0
+
+    server.join(5)
+    server.stdout.seek(0)
+    assert server.stdout.read() == HELLO_WORLD
+
+
+def test_toskeyword():
+    parser = NetcatArgumentParser(stdout=io.StringIO(), stderr=io.StringIO())
+    assert parser.toskeyword('lowdelay') == 0x10
+    assert parser.toskeyword('16') == 16
+    assert parser.toskeyword('+10') == 10
+    assert parser.toskeyword(' 10') == 10
+    assert parser.toskeyword('0x10') == 16
+    assert parser.toskeyword('ff') == 255
+    with pytest.raises(ValueError):
+        parser.toskeyword('256')
+    with pytest.raises(ValueError):
+        parser.toskeyword('zz')
+
+
+def test_listen_port_shorthand():
+    # pync -l 8000 takes the port from where dest would be.
+    parser = NetcatArgumentParser(stdout=io.StringIO(), stderr=io.StringIO())
+    args = parser.parse_args(['-l', '8000'])
+    assert args.port == 8000
+    assert args.dest == ''
+
+    stderr = io.StringIO()
+    ret = pync('-l 8000-8002', stdout=io.BytesIO(), stderr=stderr)
+    assert ret == 1
+    assert 'can only listen on one port' in stderr.getvalue()
+
+
+def test_raise_on_error():
+    parser = NetcatArgumentParser(
+            stdout=io.StringIO(),
+            stderr=io.StringIO(),
+            raise_on_error=True)
+    with pytest.raises(NetcatArgumentError):
+        # No port.
+        parser.parse_args(['localhost'])
+    with pytest.raises(NetcatArgumentError):
+        parser.parse_args(['-l', 'abc'])
+    with pytest.raises(NetcatArgumentError):
+        parser.parse_args(['-l', '8000-8002'])
+    with pytest.raises(NetcatArgumentError):
+        parser.parse_args(['-T', 'zz', 'localhost', '8000'])
+
+
+def test_tcp_server_workers():
+    # Workers are forked, which needs the main thread and a real
+    # stdout, so run the server in a process of its own.
+    if not hasattr(os, 'fork'):
+        pytest.skip('needs os.fork')
+    port = SERVER_PORT + 10
+    proc = subprocess.Popen(
+            [sys.executable, '-m', 'pync',
+                '-d', '-k', '-l', '--workers', '3', '127.0.0.1', str(port)],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port)).close()
+                break
+            except socket.error:
+                if time.time() > deadline:
+                    raise
+                time.sleep(.05)
+
+        # Every message must reach the one stdout whichever worker
+        # accepts it.
+        messages = [('m{}\n'.format(i)).encode() for i in range(8)]
+        clients = [socket.create_connection(('127.0.0.1', port))
+                for _ in messages]
+        for client, message in zip(clients, messages):
+            client.sendall(message)
+            client.shutdown(socket.SHUT_WR)
+        for client in clients:
+            # The server closes once it has written the message out.
+            client.settimeout(5)
+            while client.recv(1024):
+                pass
+            client.close()
+
+        # The workers must not outlive the parent, even when it
+        # doesn't get to clean up. They hold the stdout pipe open,
+        # so reading it only finishes once they've all gone.
+        # (A thread instead of communicate(timeout=...) for py2.)
+        output = []
+        reader = threading.Thread(
+                target=lambda: output.append(proc.stdout.read()))
+        reader.daemon = True
+        reader.start()
+        proc.send_signal(signal.SIGTERM)
+        reader.join(10)
+        assert not reader.is_alive(), 'workers outlived the server'
+        stdout = output[0]
+        proc.wait()
+    finally:
+        if proc.poll() is None:
+            proc.kill()
+
+    assert sorted(stdout.splitlines(True)) == sorted(messages)
+
+
+def test_tcp_server_workers_need_real_files():
+    stderr = io.StringIO()
+    ret = pync('-d -k -l --workers 2 127.0.0.1 {}'.format(SERVER_PORT+11),
+            stdout=io.BytesIO(),
+            stderr=stderr)
+    assert ret == 1
+    assert 'real files' in stderr.getvalue()
+
+
+def test_server_close_from_thread():
+    # Closing a server stops a thread waiting for a connection.
+    for Server in (NetcatTCPServer, NetcatUDPServer):
+        server = Server(SERVER_PORT + 12, dest='127.0.0.1',
+                stdout=io.BytesIO(), stderr=io.StringIO())
+        thread = threading.Thread(target=server.readwrite)
+        thread.daemon = True
+        thread.start()
+        time.sleep(.2)
+        server.close()
+        thread.join(2)
+        assert not thread.is_alive()